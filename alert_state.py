@@ -0,0 +1,280 @@
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+# 企业微信 Markdown 消息内容最长 4096 字节 (UTF-8)，预留一些余量
+MAX_MARKDOWN_BYTES = 4000
+
+class AlertStateStore:
+    def __init__(self, db_path: str, renotify_interval: int = 4 * 3600, digest_interval: int = 0):
+        """
+        初始化告警状态存储 (本地 SQLite 文件，多个进程可同时使用)
+        :param db_path: SQLite 文件路径
+        :param renotify_interval: 异常状态持续时，重复提醒的最小间隔 (秒)
+        :param digest_interval: 两次汇总消息之间的最小间隔 (秒)，间隔内的非紧急告警会合并到下一条汇总消息
+        """
+        self.db_path = db_path
+        self.renotify_interval = renotify_interval
+        self.digest_interval = digest_interval
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """建立 SQLite 连接 (timeout 用于等待其他进程释放写锁)"""
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _init_db(self):
+        """创建状态表"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_state ("
+                " table_name TEXT NOT NULL,"
+                " check_name TEXT NOT NULL,"
+                " ds TEXT NOT NULL,"
+                " passed INTEGER NOT NULL,"
+                " msg TEXT,"
+                " first_seen_at REAL NOT NULL,"
+                " last_notified_at REAL,"
+                " pending INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (table_name, check_name, ds))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS digest_log ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1),"
+                " last_sent_at REAL NOT NULL)"
+            )
+            # 正在运行、退出前会调用 flush 的进程，用于判断推迟的汇总消息是否有人负责发送
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS active_senders ("
+                " owner_id TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def update(self, table_name: str, check_name: str, ds: str, passed: bool, msg: str = "", queue: bool = True) -> bool:
+        """
+        更新 (表, 检查项, 日期) 的状态，并判断是否需要通知
+        需要通知的情况: 首次出现、状态发生变化 (正常 <-> 异常)、异常持续超过重复提醒间隔
+        :param table_name: 表名
+        :param check_name: 检查项名称
+        :param ds: 数据日期
+        :param passed: 本次检查是否通过
+        :param msg: 告警内容 (Markdown)，queue=True 时用于生成汇总消息
+        :param queue: 需要通知时是否加入待发送队列 (由 flush 合并发送)；调用方自行发送时传 False
+        :return: 是否需要通知
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 立即获取写锁，避免多个进程对同一告警重复判断为需要通知
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT passed, last_notified_at FROM alert_state WHERE table_name = ? AND check_name = ? AND ds = ?",
+                (table_name, check_name, ds)
+            ).fetchone()
+
+            notify = self._needs_notify(row, passed, now)
+
+            if row is None:
+                conn.execute(
+                    "INSERT INTO alert_state (table_name, check_name, ds, passed, msg, first_seen_at, last_notified_at, pending) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (table_name, check_name, ds, int(passed), msg, now, now, int(queue))
+                )
+            elif notify:
+                # 状态变化时重新记录首次出现时间
+                first_seen_sql = ", first_seen_at = ?" if bool(row[0]) != bool(passed) else ""
+                params = [int(passed), msg, now, int(queue)]
+                if first_seen_sql:
+                    params.append(now)
+                conn.execute(
+                    f"UPDATE alert_state SET passed = ?, msg = ?, last_notified_at = ?, pending = ?{first_seen_sql} "
+                    "WHERE table_name = ? AND check_name = ? AND ds = ?",
+                    params + [table_name, check_name, ds]
+                )
+            else:
+                conn.execute(
+                    "UPDATE alert_state SET msg = ? WHERE table_name = ? AND check_name = ? AND ds = ?",
+                    (msg, table_name, check_name, ds)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        # queue=False 时由调用方发送并处理日志
+        if queue and not notify:
+            print(f"[{table_name}] {check_name} ({ds}) 状态未变化，跳过通知")
+        return notify
+
+    def _needs_notify(self, row, passed: bool, now: float) -> bool:
+        """根据已记录的状态 (passed, last_notified_at) 判断本次结果是否需要通知"""
+        if row is None:
+            return True
+        if bool(row[0]) != bool(passed):
+            return True
+        if not passed and (row[1] is None or now - row[1] >= self.renotify_interval):
+            return True
+        return False
+
+    def needs_notify(self, table_name: str, check_name: str, ds: str, passed: bool) -> bool:
+        """
+        只判断是否需要通知，不更新状态 (调用方发送成功后再调用 update 记录)
+        :return: 是否需要通知
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT passed, last_notified_at FROM alert_state WHERE table_name = ? AND check_name = ? AND ds = ?",
+                (table_name, check_name, ds)
+            ).fetchone()
+        finally:
+            conn.close()
+        return self._needs_notify(row, passed, time.time())
+
+    def register_sender(self, owner_id: str, ttl: int):
+        """
+        登记当前进程会在退出前调用 flush，其他进程可以把汇总消息留给它合并发送
+        :param owner_id: 进程标识
+        :param ttl: 登记有效期 (秒)，应不短于进程最长运行时间，进程异常退出后过期失效
+        """
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO active_senders (owner_id, expires_at) VALUES (?, ?)",
+                (owner_id, time.time() + ttl)
+            )
+        finally:
+            conn.close()
+
+    def flush(self, sender, title: str = "告警汇总", force: bool = False, owner_id: Optional[str] = None) -> int:
+        """
+        将待发送队列中的告警合并为汇总消息发送 (超过长度限制时拆分为多条)
+        距上次汇总不足 digest_interval 时，只有还有其他登记的进程 (register_sender) 会在之后 flush 才推迟发送，
+        否则立即发送，保证待发送告警不会无人处理
+        :param sender: WeChatSender 实例
+        :param title: 汇总消息标题
+        :param force: 是否忽略 digest_interval 立即发送 (异常告警应立即发送)
+        :param owner_id: 当前进程的登记标识，flush 时同时取消登记
+        :return: 发送的告警条数
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if owner_id:
+                conn.execute("DELETE FROM active_senders WHERE owner_id = ?", (owner_id,))
+            conn.execute("DELETE FROM active_senders WHERE expires_at < ?", (now,))
+            if not force and self.digest_interval > 0:
+                row = conn.execute("SELECT last_sent_at FROM digest_log WHERE id = 1").fetchone()
+                others = conn.execute("SELECT count(1) FROM active_senders").fetchone()[0]
+                if row and now - row[0] < self.digest_interval and others > 0:
+                    conn.execute("COMMIT")
+                    print(f"距上次汇总发送不足 {self.digest_interval} 秒，告警留待其他进程合并发送")
+                    return 0
+
+            # 取出待发送告警并清除标记，避免并发进程重复发送
+            pending = conn.execute(
+                "SELECT table_name, check_name, ds, msg FROM alert_state WHERE pending = 1 "
+                "ORDER BY passed, table_name, ds, check_name"
+            ).fetchall()
+            if pending:
+                conn.execute("UPDATE alert_state SET pending = 0 WHERE pending = 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if not pending:
+            return 0
+
+        sent = 0
+        failed_keys = []
+        messages = self.build_digests(title, pending)
+        for content, keys in messages:
+            print(f"正在发送告警汇总 ({len(keys)} 条)...")
+            response = sender.send_markdown(content)
+            print(f"告警汇总发送结果: {response}")
+            if response.get("errcode") == 0:
+                sent += len(keys)
+            else:
+                failed_keys.extend(keys)
+
+        if failed_keys:
+            # 发送失败的告警重新放回队列，下次运行时重试
+            self._requeue(failed_keys)
+        if sent:
+            # 只有发送成功才记录汇总时间，避免发送失败的告警被再推迟一个间隔
+            self._mark_digest_sent(now)
+        return sent
+
+    def _mark_digest_sent(self, sent_at: float):
+        """记录最近一次汇总消息的发送时间"""
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO digest_log (id, last_sent_at) VALUES (1, ?)", (sent_at,))
+        finally:
+            conn.close()
+
+    def _requeue(self, keys: List[tuple]):
+        """将发送失败的告警重新标记为待发送"""
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE alert_state SET pending = 1 WHERE table_name = ? AND check_name = ? AND ds = ?",
+                keys
+            )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def build_digests(title: str, alerts: List[tuple], max_bytes: int = MAX_MARKDOWN_BYTES) -> List[tuple]:
+        """
+        将多条告警拼接为若干条 Markdown 汇总消息
+        :param title: 汇总消息标题
+        :param alerts: [(table_name, check_name, ds, msg)]
+        :param max_bytes: 单条消息最大字节数
+        :return: [(content, [(table_name, check_name, ds)])]
+        """
+        messages = []
+        header = f"### 🔔 {title}"
+        lines: List[str] = []
+        keys: List[tuple] = []
+        size = len(header.encode('utf-8'))
+
+        for table_name, check_name, ds, msg in alerts:
+            block = msg or f"> {table_name} {check_name} ({ds})"
+            block_size = len(block.encode('utf-8')) + 2 # 加上分隔空行
+            if keys and size + block_size > max_bytes:
+                messages.append(("\n\n".join([header] + lines), keys))
+                lines, keys = [], []
+                size = len(header.encode('utf-8'))
+            lines.append(block)
+            keys.append((table_name, check_name, ds))
+            size += block_size
+
+        if keys:
+            messages.append(("\n\n".join([header] + lines), keys))
+        return messages
+
+    def clean_old_states(self, days: int = 30):
+        """清理指定天数之前首次出现且已发送的状态记录"""
+        threshold = time.time() - days * 86400
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "DELETE FROM alert_state WHERE pending = 0 AND first_seen_at < ?", (threshold,)
+            )
+            if cursor.rowcount:
+                print(f"已清理 {cursor.rowcount} 条过期告警状态")
+        finally:
+            conn.close()
@@ -2,6 +2,9 @@ from pyhive import hive
 import sys
 
 class HiveChecker:
+    # 字段分布统计中 NULL 值的占位符
+    NULL_VALUE = '<NULL>'
+
     def __init__(self, host, port, username, database='default'):
         self.host = host
         self.port = port
@@ -145,64 +148,134 @@ class HiveChecker:
         finally:
             cursor.close()
 
-    def check_status_distribution(self, table_name, ds):
+    def get_table_columns(self, table_name):
+        """
+        获取表的字段列表 (包含分区字段)
+        :param table_name: 表名
+        :return: 字段名列表，查询失败返回 None
+        """
+        if not self.conn:
+            self.connect()
+        
+        cursor = self.conn.cursor()
+        try:
+            # 注意: DESCRIBE 输出通常包含 col_name, data_type, comment
+            # 分区表还会输出 "# Partition Information" 等说明行和空行，需要过滤
+            sql_desc = f"DESCRIBE {table_name}"
+            cursor.execute(sql_desc)
+            columns = []
+            for row in cursor.fetchall():
+                col_name = (row[0] or '').strip()
+                if col_name and not col_name.startswith('#') and col_name not in columns:
+                    columns.append(col_name)
+            return columns
+        except Exception as e:
+            print(f"[{table_name}] 获取表结构失败: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def get_table_location(self, table_name):
+        """
+        获取表的存储路径 (只查询元数据，用于分区目录探测)
+        :param table_name: 表名
+        :return: 存储路径 (如 hdfs://nameservice/user/hive/warehouse/db.db/table)，查询失败返回 None
+        """
+        if not self.conn:
+            self.connect()
+        
+        cursor = self.conn.cursor()
+        try:
+            # DESCRIBE FORMATTED 输出中 "Location:" 一行的第二列为存储路径
+            cursor.execute(f"DESCRIBE FORMATTED {table_name}")
+            for row in cursor.fetchall():
+                if (row[0] or '').strip() == 'Location:':
+                    return (row[1] or '').strip() or None
+            print(f"[{table_name}] 未找到存储路径")
+            return None
+        except Exception as e:
+            print(f"[{table_name}] 获取存储路径失败: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def get_partition_count(self, table_name, ds):
         """
-        检查指定分区的 status 字段分布情况
+        查询指定分区的数据量
         :param table_name: 表名
         :param ds: 分区日期
-        :return: (has_status_field, is_abnormal, message)
-                 has_status_field: 是否包含 status 字段
-                 is_abnormal: 是否异常 (全部为1或全部为2)
-                 message: 描述信息
+        :return: 数据量，查询失败返回 0
         """
         if not self.conn:
             self.connect()
         
         cursor = self.conn.cursor()
         try:
-            # 1. 检查是否存在 status 字段
-            # 注意：Hive 的 DESCRIBE 输出格式可能因版本而异，这里更稳妥的方式是直接尝试查询
-            # 或者先查询一条数据看看列名 (前面 get_partition_data 已经做过，但为了解耦这里独立处理)
-            
-            # 尝试查询 status 字段的去重值
-            sql = f"SELECT distinct status FROM {table_name} WHERE ds = '{ds}'"
-            print(f"[{table_name}] 正在检查 status 分布: {sql}")
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            
-            if not results:
-                # 可能是没数据，也可能是字段不存在（但通常字段不存在会在 execute 时抛错）
-                # 如果是空数据，前面 count=0 已经拦截了，这里假定有数据
-                return True, False, "无 status 数据"
-
-            # 提取所有去重后的 status 值
-            status_values = [row[0] for row in results]
-            status_set = set(status_values)
-            
-            # 检查是否只有 1 或只有 2
-            # 注意 status 类型可能是 int 或 string，做兼容处理
-            status_set_str = {str(v) for v in status_set}
-            
-            if status_set_str == {'1'}:
-                return True, True, "status 字段值全部为 1"
-            elif status_set_str == {'2'}:
-                return True, True, "status 字段值全部为 2"
+            sql_count = f"SELECT count(1) FROM {table_name} WHERE ds = '{ds}'"
+            print(f"[{table_name}] 正在查询数据量: {sql_count}")
+            cursor.execute(sql_count)
+            result_count = cursor.fetchone()
+            return result_count[0] if result_count else 0
+        except Exception as e:
+            print(f"[{table_name}] 查询数据量失败: {e}")
+            return 0
+        finally:
+            cursor.close()
+
+    def get_value_histograms(self, table_name, columns, start_ds, end_ds):
+        """
+        按 ds 一次扫描查询日期区间内每天的数据量和多个字段的取值分布
+        使用 GROUPING SETS ((ds), (ds, 字段1), (ds, 字段2) ...) 在同一个聚合中完成
+        :param table_name: 表名
+        :param columns: 需要统计分布的字段列表 (可以为空，此时只统计数据量)
+        :param start_ds: 开始日期 (包含)，格式 YYYY-MM-DD
+        :param end_ds: 结束日期 (包含)，格式 YYYY-MM-DD
+        :return: {ds: {"count": 数据量, "columns": {字段名: {取值: 数据量}}}}，只包含有数据的分区
+                 取值统一转为字符串，NULL 记为 HiveChecker.NULL_VALUE
+        """
+        if not self.conn:
+            self.connect()
+        
+        cursor = self.conn.cursor()
+        try:
+            where = f"ds >= '{start_ds}' AND ds <= '{end_ds}'"
+            if columns:
+                # 子查询中将字段统一转为字符串并把 NULL 替换为占位值，
+                # 这样聚合结果中只有本分组的字段非 NULL，可以据此区分每行属于哪个分组 (不依赖 GROUPING__ID，兼容不同 Hive 版本)
+                aliases = [f"c{i}" for i in range(len(columns))]
+                select_cols = ", ".join(
+                    f"coalesce(cast({col} as string), '{self.NULL_VALUE}') AS {alias}"
+                    for col, alias in zip(columns, aliases)
+                )
+                grouping_sets = ", ".join(["(ds)"] + [f"(ds, {alias})" for alias in aliases])
+                sql = (
+                    f"SELECT ds, {', '.join(aliases)}, count(1) FROM "
+                    f"(SELECT ds, {select_cols} FROM {table_name} WHERE {where}) t "
+                    f"GROUP BY ds, {', '.join(aliases)} GROUPING SETS ({grouping_sets})"
+                )
             else:
-                return True, False, f"status 分布正常 (包含: {status_set_str})"
+                sql = f"SELECT ds, count(1) FROM {table_name} WHERE {where} GROUP BY ds"
+            print(f"[{table_name}] 正在按天查询数据量和字段分布: {sql}")
+            cursor.execute(sql)
 
-        except Exception as e:
-            # 如果报错包含 "Column 'status' not found" 或类似信息，说明没有 status 字段
-            # 简单的判断方式是看异常信息
-            error_msg = str(e).lower()
-            if "column" in error_msg and "status" in error_msg and "not found" in error_msg:
-                 print(f"[{table_name}] 不存在 status 字段，跳过检查")
-                 return False, False, "无 status 字段"
-            elif "semanticexception" in error_msg and "status" in error_msg: # Hive 常见的列不存在错误
-                 print(f"[{table_name}] 不存在 status 字段，跳过检查")
-                 return False, False, "无 status 字段"
+            stats = {}
+            for row in cursor.fetchall():
+                ds = str(row[0])
+                day = stats.setdefault(ds, {"count": 0, "columns": {col: {} for col in columns}})
+                count = row[-1] or 0
+                values = row[1:-1]
+                for col, value in zip(columns, values):
+                    if value is not None:
+                        day["columns"][col][str(value)] = count
+                        break
+                else:
+                    # 所有字段都为 NULL 的是 (ds) 分组，即当天总数据量
+                    day["count"] = count
             
-            print(f"[{table_name}] status 检查失败 (可能无此字段): {e}")
-            return False, False, f"status 检查出错: {e}"
+            return stats
+        except Exception as e:
+            print(f"[{table_name}] 查询字段分布失败: {e}")
+            return {}
         finally:
             cursor.close()
 
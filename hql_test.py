@@ -1,3 +1,9 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
 from hive_checker import HiveChecker
 
 # 配置信息
@@ -5,89 +11,280 @@ HIVE_HOST = '192.168.10.3'
 HIVE_PORT = 10000
 HIVE_USER = 'hadoop'
 
-def execute_custom_sql(sql):
+# 结果缓存 (按规范化后的 SQL 缓存最近的查询结果，重复调试同一条 SQL 时直接返回)
+CACHE_DIR = os.path.join(os.getcwd(), ".query_cache")
+CACHE_TTL = 3600 # 缓存有效期 (秒)
+CACHE_MAX_FILES = 50 # 最多保留的缓存文件数
+CACHE_MAX_ROWS = 10000 # 单条 SQL 最多缓存的行数，结果超过时不缓存 (避免为缓存在内存中保留大量数据)
+
+def normalize_sql(sql):
+    """
+    规范化 SQL 用作缓存 key: 去掉 -- 注释、合并连续空白、去掉末尾分号 (引号内的内容保持不变)
+    :param sql: 原始 SQL
+    :return: 规范化后的 SQL
+    """
+    result = []
+    quote = None
+    pending_space = False
+    i = 0
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            result.append(ch)
+            if ch == '\\' and i + 1 < len(sql):
+                result.append(sql[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch == '-' and sql[i:i + 2] == '--':
+            # 跳过注释直到行尾
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+        else:
+            if pending_space and result:
+                result.append(' ')
+            pending_space = False
+            result.append(ch)
+            if ch in ('"', "'", '`'):
+                quote = ch
+        i += 1
+    return ''.join(result).rstrip('; ')
+
+def get_cache_path(sql):
+    """获取 SQL 对应的缓存文件路径"""
+    key = hashlib.sha1(normalize_sql(sql).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def load_cache(sql, limit):
+    """
+    读取缓存的查询结果 (缓存未过期且包含足够的行数才可用)
+    :param sql: SQL 语句
+    :param limit: 需要的行数 (0 表示需要全部结果)
+    :return: (columns, rows) 或 None
+    """
+    cache_path = get_cache_path(sql)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except Exception as e:
+        print(f"读取缓存失败: {e}")
+        return None
+
+    if time.time() - cached['created_at'] > CACHE_TTL:
+        return None
+    # 缓存的是截断后的结果时，只能满足不超过缓存行数的预览
+    if not cached['complete'] and (limit == 0 or len(cached['rows']) < limit):
+        return None
+    return cached['columns'], cached['rows']
+
+def save_cache(sql, columns, rows, complete):
+    """
+    保存查询结果到缓存，并清理超出数量上限的旧缓存
+    :param complete: 是否为完整结果 (未被预览行数截断)
     """
-    执行自定义 SQL 并打印结果
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_path = get_cache_path(sql)
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "sql": normalize_sql(sql),
+                "columns": columns,
+                "rows": rows,
+                "complete": complete,
+                "created_at": time.time()
+            }, f, ensure_ascii=False, default=str)
+    except Exception as e:
+        print(f"保存缓存失败: {e}")
+        return
+
+    cache_files = sorted(
+        (os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for old_file in cache_files[:-CACHE_MAX_FILES]:
+        os.remove(old_file)
+
+def wait_for_next_page():
+    """分页模式下等待用户确认是否继续，返回 False 表示停止"""
+    try:
+        answer = input("-- 回车显示下一页，输入 q 退出 -- ")
+    except EOFError:
+        return False
+    return answer.strip().lower() != 'q'
+
+def print_rows(rows, start_index, page_size, paging):
+    """
+    打印一批数据 (缓存结果按页打印)
+    :return: 是否继续打印
+    """
+    for offset in range(0, len(rows), page_size):
+        for i, row in enumerate(rows[offset:offset + page_size]):
+            print(f"Row {start_index + offset + i + 1}: {tuple(row)}")
+        if paging and offset + page_size < len(rows) and not wait_for_next_page():
+            return False
+    return True
+
+def print_explain(checker, sql):
+    """打印 SQL 的执行计划"""
+    cursor = checker.conn.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {sql}")
+        print("执行计划:")
+        for row in cursor.fetchall():
+            print(row[0])
+        print("-" * 50)
+    finally:
+        cursor.close()
+
+def execute_custom_sql(sql, limit=10, page_size=100, paging=False, explain=False, use_cache=True):
+    """
+    执行自定义 SQL 并流式打印结果 (按 page_size 分批 fetchmany，达到预览行数后停止拉取并取消查询)
     :param sql: 要执行的 HQL 语句
+    :param limit: 最多显示的行数，0 表示显示全部
+    :param page_size: 每次拉取 (及分页显示) 的行数
+    :param paging: 是否每显示一页等待用户确认
+    :param explain: 是否先打印执行计划
+    :param use_cache: 是否使用结果缓存
     """
-    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
-    
+    sql = sql.strip().rstrip(';')
     print(f"准备执行 SQL:\n{sql}\n")
     print("-" * 50)
-    
+
+    if use_cache and not explain:
+        cached = load_cache(sql, limit)
+        if cached:
+            columns, rows = cached
+            if limit:
+                rows = rows[:limit]
+            print(f"(命中缓存: {get_cache_path(sql)})")
+            print(f"列名: {columns}")
+            print_rows(rows, 0, page_size, paging)
+            print(f"共显示 {len(rows)} 条记录")
+            return
+
+    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
+
     try:
         if not checker.conn:
             checker.connect()
-            
+
+        if explain:
+            print_explain(checker, sql)
+
         cursor = checker.conn.cursor()
-        cursor.execute(sql)
-        
-        # 获取列名
-        columns = []
-        if cursor.description:
-            columns = [col[0].split('.')[-1] for col in cursor.description]
-            print(f"列名: {columns}")
-            
-        # 获取结果
-        results = cursor.fetchall()
-        print(f"查询到 {len(results)} 条记录:")
-        
-        for i, row in enumerate(results):
-            print(f"Row {i+1}: {row}")
-            
-            # 如果只想看前几条，可以在这里 break
-            if i >= 9:
-                print("... (只显示前 10 条)")
-                break
-                
+        try:
+            cursor.execute(sql)
+
+            # 获取列名
+            columns = []
+            if cursor.description:
+                columns = [col[0].split('.')[-1] for col in cursor.description]
+                print(f"列名: {columns}")
+
+            # 分批获取结果，边拉取边打印，避免一次性 fetchall 占用大量内存
+            # 只在开启缓存时保留已拉取的行，超过 CACHE_MAX_ROWS 后不再保留也不缓存
+            rows = []
+            keep_rows = use_cache
+            shown = 0
+            complete = True
+            stopped = False
+            while True:
+                fetch_size = page_size if not limit else min(page_size, limit - shown)
+                batch = cursor.fetchmany(fetch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    shown += 1
+                    print(f"Row {shown}: {row}")
+                    if keep_rows:
+                        rows.append(list(row))
+                if keep_rows and len(rows) > CACHE_MAX_ROWS:
+                    print(f"(结果超过 {CACHE_MAX_ROWS} 行，不缓存)")
+                    keep_rows = False
+                    rows = []
+
+                if limit and shown >= limit:
+                    # 已达到预览行数，再取一行判断是否还有剩余结果，有则不再拉取
+                    if cursor.fetchmany(1):
+                        complete = False
+                        print(f"... (只显示前 {limit} 条)")
+                    break
+                if len(batch) < fetch_size:
+                    break
+                if paging and not wait_for_next_page():
+                    complete = False
+                    stopped = True
+                    break
+
+            if complete:
+                print(f"查询到 {shown} 条记录")
+            elif stopped:
+                print(f"已停止，共显示 {shown} 条记录")
+
+            if not complete:
+                # 结果未拉取完，取消服务端查询释放资源
+                try:
+                    cursor.cancel()
+                    print("已取消剩余查询")
+                except Exception as e:
+                    print(f"取消查询失败: {e}")
+
+            if keep_rows and not stopped:
+                save_cache(sql, columns, rows, complete)
+        finally:
+            cursor.close()
+
     except Exception as e:
         print(f"SQL 执行出错: {e}")
     finally:
         checker.close()
 
+def read_sql(args):
+    """按优先级从命令行参数、文件或标准输入读取 SQL"""
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            return f.read()
+    if args.sql and args.sql != '-':
+        return args.sql
+    if args.sql == '-' or not sys.stdin.isatty():
+        return sys.stdin.read()
+    return None
+
 if __name__ == "__main__":
-    # 在这里编写你的 SQL 语句
-    my_sql = """
-    select* from(SELECT sn,
-    bgtime as stay_begin_time,
-    addr as stay_address,
-    edtime as stay_end_time,
-    duration as duration_time,
-    lng as stay_longitude,
-    lat as stay_latitude,
-    prov as stay_province,
-    city as stay_city,
-    country as stay_country,
-    row_number() over(partition by sn order by bgtime desc) as rn
-    FROM glsx_data_warehouse.t_gps_stay
-    WHERE  day >= '2025-12-09'
-    AND (lng IS NOT NULL
-    AND lng <>'')
-    AND (lat IS NOT NULL
-    AND lat <>'') 
-    AND duration/3600 >=1) A
-    WHERE A.rn = 1 and A.sn='96310200907'
-    """
+    parser = argparse.ArgumentParser(
+        description="HQL 调试工具: 执行 SQL 并流式预览结果",
+        epilog="示例: python hql_test.py \"SELECT * FROM glsx_data_warehouse.t_gps_stay WHERE day = '2025-12-09'\" --limit 20"
+    )
+    parser.add_argument("sql", nargs="?", help="要执行的 SQL，传 - 或不传时从标准输入读取")
+    parser.add_argument("-f", "--file", help="从文件读取 SQL")
+    parser.add_argument("-n", "--limit", type=int, help="最多显示的行数，0 表示显示全部 (默认 10，分页模式下默认显示全部)")
+    parser.add_argument("--page-size", type=int, default=100, help="每次拉取的行数 (默认 100)")
+    parser.add_argument("-p", "--page", action="store_true", help="分页显示，每页 (--page-size 行) 等待回车确认")
+    parser.add_argument("--explain", action="store_true", help="先打印执行计划 (EXPLAIN)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用结果缓存，强制重新查询")
+    args = parser.parse_args()
 
-    my_sql = """
-    SELECT sn,
-    bgtime as stay_begin_time,
-    addr as stay_address,
-    edtime as stay_end_time,
-    duration as duration_time,
-    lng as stay_longitude,
-    lat as stay_latitude,
-    prov as stay_province,
-    city as stay_city,
-    country as stay_country
-    FROM glsx_data_warehouse.t_gps_stay
-    WHERE  day >= '2025-12-09'
-    AND (lng IS NOT NULL
-    AND lng <>'')
-    AND (lat IS NOT NULL
-    AND lat <>'') 
-    AND duration/3600 >=1
-    AND sn='96310200907'
-    """
-    
-    execute_custom_sql(my_sql)
+    sql = read_sql(args)
+    if not sql or not sql.strip():
+        parser.print_help()
+        sys.exit(1)
+    if args.limit is None:
+        # 分页模式下默认的 10 行预览不足一页，改为显示全部，由用户逐页决定是否继续
+        args.limit = 0 if args.page else 10
+    if args.limit < 0 or args.page_size <= 0:
+        parser.error("--limit 不能为负数，--page-size 必须大于 0")
+
+    execute_custom_sql(
+        sql,
+        limit=args.limit,
+        page_size=args.page_size,
+        paging=args.page,
+        explain=args.explain,
+        use_cache=not args.no_cache
+    )
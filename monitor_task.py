@@ -1,9 +1,18 @@
+import argparse
 import datetime
 import csv
+import json
 import os
 import re
+import shutil
+import socket
+import sys
+import time
+from alert_state import AlertStateStore
 from hive_checker import HiveChecker
+from partition_probe import TableLocationCache, create_partition_probe
 from wechat_sender import WeChatSender
+from work_queue import LeaseKeeper, WorkQueue
 
 # 配置信息
 HIVE_HOST = '192.168.10.3'
@@ -21,13 +30,60 @@ TARGET_TABLES = [
     "glsx_data_warehouse.ads_zlgj_stay_warning_black_area_res"
 ]
 
+# 字段分布检查配置: 表名 -> {字段名: 检查规则}，未单独配置的表使用 "default"
+# 同一张表的所有字段在一次 GROUPING SETS 聚合中统计，表中不存在的字段跳过检查
+# 检查规则:
+#   name: 报告中显示的检查项名称 (默认为 "<字段名>分布")
+#   allow_single_value: 是否允许所有数据为同一个值 (默认 False，即取值塌缩为一个值视为异常)
+#   collapsed_values: 只有塌缩为这些取值之一时才视为异常 (不配置则塌缩为任意值都视为异常)
+#   expected_values: 期望取值集合 (字符串)，出现集合外的取值视为异常，不配置则不检查
+#   max_shift: 与前一天分布相比允许的最大变化比例 (0~1，按总变差距离计算)，不配置则不检查
+DISTRIBUTION_CHECKS = {
+    "default": {
+        # 与原有 status 检查一致: 只有全部为 1 或全部为 2 时视为异常
+        "status": {"name": "数据状态", "collapsed_values": ["1", "2"]},
+    },
+    # 示例: 多个枚举字段
+    # "glsx_data_warehouse.ads_zlgj_offline_warning_black_area_res": {
+    #     "status": {"name": "数据状态", "expected_values": ["1", "2"]},
+    #     "province": {"max_shift": 0.3},
+    #     "city": {"max_shift": 0.3},
+    #     "warning_type": {"expected_values": ["1", "2", "3"]},
+    # },
+}
+
 # 企业微信 Webhook
 WEBHOOK_URL = "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=d741ee77-b177-4f92-b478-e5357cadf990"
 
+# 告警状态存储 (与 pre_job_check.py 共用)
+# 同一天重复运行时，只有检查结果发生变化 (或异常持续超过重复提醒间隔) 才重新发送日报
+ALERT_STATE_DB = os.path.join(os.getcwd(), "state", "alert_state.db")
+ALERT_RENOTIFY_INTERVAL = 4 * 3600
+
+# 存储层分区探测: 开启后通过表的分区目录获取最新分区 (不执行 max(ds) 查询)，只用 SQL 统计数据量
+# 无 ds 分区目录或存储路径不支持的表仍使用 SQL 查询
+PARTITION_PROBE_ENABLED = False
+WEBHDFS_URL = None # 例如 "http://192.168.10.3:9870/webhdfs/v1"，hdfs:// 存储路径需要配置
+WEBHDFS_USER = 'hadoop'
+PARTITION_SUCCESS_MARKER = None # 分区完成标记文件 (如 "_SUCCESS")，为 None 时分区目录存在即视为产出
+TABLE_LOCATION_CACHE = os.path.join(os.getcwd(), "state", "table_locations.json") # 表存储路径缓存，避免每次运行执行 DESCRIBE FORMATTED
+
+# 分布式模式 (--role coordinator/worker)
+# 工作目录存放任务队列 work_queue.db 和各表的明细结果，多台主机运行时需放在共享存储上
+WORK_DIR = os.path.join(os.getcwd(), "state")
+WORK_LEASE_SECONDS = 600 # 任务租约时长，worker 每 1/3 租约时长续约一次，超时未续约的任务会被重新分配
+WORK_MAX_ATTEMPTS = 3 # 单张表最多被领取的次数
+WORK_POLL_INTERVAL = 10 # 等待任务时的轮询间隔 (秒)
+WORK_TIMEOUT = 2 * 3600 # 协调进程等待所有表检查完成的最长时间 (秒)，worker 等待任务入队的最长时间
+
 def get_date_str(days_offset=0):
     """获取指定偏移量的日期字符串 (YYYY-MM-DD)"""
     return (datetime.datetime.now() - datetime.timedelta(days=days_offset)).strftime('%Y-%m-%d')
 
+def shift_date_str(ds, days_offset):
+    """获取指定日期向前偏移若干天后的日期字符串 (YYYY-MM-DD)"""
+    return (datetime.datetime.strptime(ds, '%Y-%m-%d') - datetime.timedelta(days=days_offset)).strftime('%Y-%m-%d')
+
 def clean_old_reports(days=30):
     """清理指定天数之前的报告文件"""
     report_dir = os.path.join(os.getcwd(), "reports")
@@ -51,15 +107,16 @@ def clean_old_reports(days=30):
             except ValueError:
                 continue
 
-def check_table_status_detail(max_ds, count):
+def check_table_status_detail(max_ds, count, base_date=None):
     """
     检查表状态 (返回详细检查项)
     :param max_ds: 最大分区日期
     :param count: 数据量
+    :param base_date: 检查基准日期 (YYYY-MM-DD)，默认为今天；回溯检查时传入被检查的日期
     :return: 检查项列表
     """
-    today = get_date_str(0)
-    yesterday = get_date_str(1)
+    today = base_date or get_date_str(0)
+    yesterday = shift_date_str(today, 1)
     
     checks = []
     
@@ -87,6 +144,110 @@ def check_table_status_detail(max_ds, count):
     
     return checks
 
+def get_configured_rules(table):
+    """获取表配置的字段分布检查规则 (未单独配置时使用 default)"""
+    return DISTRIBUTION_CHECKS.get(table, DISTRIBUTION_CHECKS.get("default", {}))
+
+def get_distribution_rules(table, table_columns):
+    """
+    获取表的字段分布检查规则，并过滤掉表中不存在的字段
+    :param table: 表名
+    :param table_columns: 表字段列表 (HiveChecker.get_table_columns 的返回值)，获取失败时为 None
+    :return: (rules, missing_rules)
+             rules: {字段名: 检查规则}，只包含表中存在的字段
+             missing_rules: {字段名: 检查规则}，表中不存在的配置字段
+    """
+    configured = get_configured_rules(table)
+    if not configured:
+        return {}, {}
+    
+    if table_columns is None:
+        # 获取表结构失败时不检查分布 (只统计数据量)，避免不存在的字段导致整个聚合查询失败、被误报为无数据
+        print(f"[{table}] 获取表结构失败，跳过字段分布检查")
+        return {}, {}
+    
+    rules = {col: rule for col, rule in configured.items() if col in table_columns}
+    missing_rules = {col: rule for col, rule in configured.items() if col not in table_columns}
+    return rules, missing_rules
+
+def calc_distribution_shift(histogram, prev_histogram):
+    """
+    计算两天取值分布的变化比例 (总变差距离: 各取值占比之差的绝对值之和的一半，0 表示完全相同，1 表示完全不同)
+    :param histogram: 当天分布 {取值: 数据量}
+    :param prev_histogram: 前一天分布 {取值: 数据量}
+    :return: 变化比例 (0~1)
+    """
+    total = sum(histogram.values())
+    prev_total = sum(prev_histogram.values())
+    if not total or not prev_total:
+        return 0.0
+    values = set(histogram) | set(prev_histogram)
+    return sum(abs(histogram.get(v, 0) / total - prev_histogram.get(v, 0) / prev_total) for v in values) / 2
+
+def check_value_distribution(column, rule, histogram, prev_histogram=None):
+    """
+    检查单个字段的取值分布 (返回检查项)
+    :param column: 字段名
+    :param rule: 检查规则 (见 DISTRIBUTION_CHECKS)
+    :param histogram: 当天分布 {取值: 数据量}
+    :param prev_histogram: 前一天分布 {取值: 数据量}，没有前一天数据时为 None
+    :return: 检查项
+    """
+    problems = []
+    values = set(histogram)
+    
+    # 1. 取值塌缩检查 (如 status 全部为 1)
+    if len(values) == 1 and not rule.get("allow_single_value", False):
+        single_value = next(iter(values))
+        collapsed_values = rule.get("collapsed_values")
+        if collapsed_values is None or single_value in {str(v) for v in collapsed_values}:
+            problems.append(f"{column} 字段值全部为 {single_value}")
+    
+    # 2. 非预期取值检查
+    expected_values = rule.get("expected_values")
+    if expected_values is not None:
+        unexpected = sorted(values - {str(v) for v in expected_values})
+        if unexpected:
+            shown = ", ".join(unexpected[:5]) + (" 等" if len(unexpected) > 5 else "")
+            problems.append(f"{column} 出现非预期取值: {shown}")
+    
+    # 3. 与前一天分布对比
+    max_shift = rule.get("max_shift")
+    if max_shift is not None and prev_histogram:
+        shift = calc_distribution_shift(histogram, prev_histogram)
+        if shift > max_shift:
+            problems.append(f"{column} 分布较前一天变化 {shift:.0%} (阈值 {max_shift:.0%})")
+    
+    return {
+        "name": rule.get("name", f"{column}分布"),
+        "passed": not problems,
+        "msg": "; ".join(problems) if problems else "正常"
+    }
+
+def build_distribution_checks(rules, missing_rules, count, day_stats, prev_day_stats=None):
+    """
+    根据字段分布统计结果生成分布检查项
+    :param rules: {字段名: 检查规则}
+    :param missing_rules: {字段名: 检查规则}，表中不存在的配置字段
+    :param count: 数据量 (没有数据时不检查分布)
+    :param day_stats: 当天统计结果 (get_value_histograms 返回值中的一天)，没有数据时为 None
+    :param prev_day_stats: 前一天统计结果，没有数据时为 None
+    :return: 检查项列表
+    """
+    checks = []
+    for column, rule in rules.items():
+        if count > 0 and day_stats:
+            prev_histogram = prev_day_stats["columns"].get(column) if prev_day_stats else None
+            checks.append(check_value_distribution(column, rule, day_stats["columns"].get(column, {}), prev_histogram))
+        else:
+            checks.append({"name": rule.get("name", f"{column}分布"), "passed": True, "msg": "-"})
+    
+    # 表中不存在的字段视为通过，只做提示
+    for column, rule in missing_rules.items():
+        checks.append({"name": rule.get("name", f"{column}分布"), "passed": True, "msg": f"无 {column} 字段"})
+    
+    return checks
+
 def save_details_to_csv(all_data, filename):
     """保存明细数据到 CSV 文件"""
     if not all_data:
@@ -118,85 +279,109 @@ def save_details_to_csv(all_data, filename):
         print(f"保存 CSV 失败: {e}")
         return None
 
-def run_monitor():
-    # 先清理过期报告
-    clean_old_reports()
-
-    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
-    results = []
-    all_details = [] # 用于存储所有表的明细数据
+def get_latest_partition_info(checker, table, min_ds, table_columns=None):
+    """
+    获取最新分区及其数据量 (开启分区探测时从分区目录获取最新分区，否则查询 max(ds))
+    :param checker: HiveChecker 实例
+    :param table: 表名
+    :param min_ds: 最小日期过滤 (ds > min_ds)
+    :param table_columns: 已查询的表字段列表，用于跳过无 ds 字段的表 (为 None 时只根据分区目录判断)
+    :return: (max_ds, count)
+    """
+    probe = None
+    if PARTITION_PROBE_ENABLED:
+        try:
+            probe = create_partition_probe(
+                checker, table, WEBHDFS_URL, WEBHDFS_USER, PARTITION_SUCCESS_MARKER,
+                columns=table_columns, location_cache=TableLocationCache(TABLE_LOCATION_CACHE)
+            )
+        except Exception as e:
+            print(f"[{table}] 创建分区探测失败，使用 SQL 查询: {e}")
     
-    print("开始执行数据质量监控...")
-    try:
-        # 计算过滤日期 (当前日期 - 3天)
-        three_days_ago = get_date_str(3)
-        print(f"查询过滤条件: ds > {three_days_ago}")
+    if probe:
+        try:
+            max_ds = probe.latest_partition(min_ds=min_ds)
+        except Exception as e:
+            print(f"[{table}] 分区目录探测失败，使用 SQL 查询: {e}")
+        else:
+            print(f"[{table}] 分区目录中的最新分区: {max_ds}")
+            if not max_ds:
+                return None, 0
+            return max_ds, checker.get_partition_count(table, max_ds)
+    
+    return checker.get_latest_partition_info(table, min_ds=min_ds)
 
-        for table in TARGET_TABLES:
-            # 去掉库名显示，保持简洁
-            short_table_name = table.split('.')[-1]
-            
-            print(f"正在检查表: {short_table_name}")
-            # 传入 min_ds 参数
-            max_ds, count = checker.get_latest_partition_info(table, min_ds=three_days_ago)
-            
-            # 获取基础检查项
-            checks = check_table_status_detail(max_ds, count)
-            
-            # 状态分布检查 (如果基础检查通过且有数据)
-            # 默认状态检查通过
-            status_check = {
-                "name": "数据状态",
-                "passed": True,
-                "msg": "正常"
-            }
-            
-            # 如果前面有失败，或者没数据，可能无法检查状态，或者状态检查也视为不通过(视情况而定)
-            # 这里逻辑：如果有数据，就去查状态；如果没有数据，状态检查显示为"无数据跳过"或者包含在数据量检查里
-            
-            if count > 0:
-                has_status, is_abnormal, dist_msg = checker.check_status_distribution(table, max_ds)
-                if has_status:
-                    if is_abnormal:
-                        status_check["passed"] = False
-                        status_check["msg"] = dist_msg # 如 "status 字段值全部为 1"
-                    else:
-                        status_check["msg"] = "正常" # 显式覆盖
-                else:
-                     status_check["msg"] = "无 status 字段" # 可选，视需求是否作为通过
-            else:
-                status_check["msg"] = "-"
+def check_table(checker, table, monitor_date):
+    """
+    检查单张表 (数据时效、数据量、字段分布)，并查询最新分区明细
+    :param checker: HiveChecker 实例
+    :param table: 表名 (包含库名)
+    :param monitor_date: 监控日期 (YYYY-MM-DD)
+    :return: (result, details)
+             result: {"table": 表名, "checks": 检查项列表, "is_healthy": 是否健康}
+             details: 明细数据列表 (dict，已添加 '作业来源')
+    """
+    # 去掉库名显示，保持简洁
+    short_table_name = table.split('.')[-1]
+    
+    print(f"正在检查表: {short_table_name}")
+    # 表结构只查询一次，分区探测和字段分布检查共用
+    table_columns = None
+    if PARTITION_PROBE_ENABLED or get_configured_rules(table):
+        table_columns = checker.get_table_columns(table)
+    
+    # 传入 min_ds 参数 (监控日期 - 3天)
+    max_ds, count = get_latest_partition_info(checker, table, shift_date_str(monitor_date, 3), table_columns)
+    
+    # 获取基础检查项
+    checks = check_table_status_detail(max_ds, count, base_date=monitor_date)
+    
+    # 字段分布检查 (有数据才查询)，有规则配置 max_shift 时一次聚合同时得到前一天的分布，否则只扫描最新分区
+    rules, missing_rules = get_distribution_rules(table, table_columns)
+    day_stats, prev_day_stats = None, None
+    if count > 0 and rules:
+        start_ds = max_ds
+        if any(rule.get("max_shift") is not None for rule in rules.values()):
+            start_ds = shift_date_str(max_ds, 1)
+        stats = checker.get_value_histograms(table, list(rules), start_ds, max_ds)
+        day_stats = stats.get(max_ds)
+        if start_ds != max_ds:
+            prev_day_stats = stats.get(start_ds)
+    checks.extend(build_distribution_checks(rules, missing_rules, count, day_stats, prev_day_stats))
+    
+    # 汇总该表是否整体健康
+    is_healthy = all(c['passed'] for c in checks)
+    
+    result = {
+        "table": short_table_name,
+        "checks": checks,
+        "is_healthy": is_healthy
+    }
+    
+    # 如果有数据，查询明细并汇总
+    details = []
+    if max_ds and count > 0:
+        cols, data = checker.get_partition_data(table, max_ds)
+        for row in data:
+            # 将 row (tuple) 转为 dict，并添加来源表信息
+            row_dict = dict(zip(cols, row))
+            row_dict['作业来源'] = short_table_name
+            details.append(row_dict)
+    
+    return result, details
 
-            checks.append(status_check)
-            
-            # 汇总该表是否整体健康
-            is_healthy = all(c['passed'] for c in checks)
-            
-            results.append({
-                "table": short_table_name,
-                "checks": checks,
-                "is_healthy": is_healthy
-            })
-            
-            # 如果有数据，查询明细并汇总
-            if max_ds and count > 0:
-                cols, data = checker.get_partition_data(table, max_ds)
-                for row in data:
-                    # 将 row (tuple) 转为 dict，并添加来源表信息
-                    row_dict = dict(zip(cols, row))
-                    row_dict['作业来源'] = short_table_name
-                    all_details.append(row_dict)
-            
-    except Exception as e:
-        print(f"监控执行过程出错: {e}")
-    finally:
-        checker.close()
-        
+def send_daily_report(results, all_details, monitor_date, alert_store):
+    """
+    生成日报 (Markdown + CSV 明细) 并发送到企业微信
+    :param results: 每张表的检查结果列表 (check_table 返回的 result)
+    :param all_details: 所有表的明细数据
+    :param monitor_date: 监控日期 (YYYY-MM-DD)
+    :param alert_store: AlertStateStore 实例，检查结果与上次发送时相同则不重复发送
+    """
     # 生成 Markdown 报告
-    today_str = get_date_str()
     report_lines = [
         f"### 📊 数据质量监控日报",
-        f"> 📅 监控日期: {today_str}",
+        f"> 📅 监控日期: {monitor_date}",
         ""
     ]
     
@@ -232,17 +417,300 @@ def run_monitor():
     # 初始化发送器
     sender = WeChatSender(WEBHOOK_URL)
     
+    # 顺带发送前置任务检查中尚未合并发送的通知
+    alert_store.flush(sender, title="前置任务检查汇总", force=True)
+    
+    # 判断日报是否需要发送 (只读取状态，发送成功后再记录，发送失败时重跑可以重新发送)
+    should_send = any(
+        alert_store.needs_notify(item['table'], c['name'], monitor_date, c['passed'])
+        for item in results for c in item['checks']
+    ) or not results # 没有任何检查结果 (如连接失败) 时照常发送
+    
+    # 1. 发送 Markdown 消息
+    sent = False
+    if should_send:
+        print("正在发送企业微信 Markdown 通知...")
+        response_md = sender.send_markdown(markdown_content)
+        print(f"Markdown 发送结果: {response_md}")
+        sent = response_md.get("errcode") == 0
+    else:
+        print("检查结果与上次发送时相同，跳过企业微信通知")
+    
+    # 记录每个检查项的状态 (发送失败时不记录，保持"需要通知")
+    if sent or not should_send:
+        for item in results:
+            for c in item['checks']:
+                alert_store.update(item['table'], c['name'], monitor_date, c['passed'], c['msg'], queue=False)
+    
+    # 2. 生成并发送 CSV 明细文件
+    # 保存到 reports 目录
+    report_dir = os.path.join(os.getcwd(), "reports")
+    csv_filename = os.path.join(report_dir, f"detail_report_{monitor_date}.csv")
+    
+    if save_details_to_csv(all_details, csv_filename) and should_send:
+        print(f"正在上传并发送文件: {csv_filename}...")
+        media_id = sender.upload_file(csv_filename)
+        if media_id:
+            response_file = sender.send_file(media_id)
+            print(f"文件发送结果: {response_file}")
+        else:
+            print("文件上传失败，跳过文件发送")
+
+def run_monitor():
+    # 先清理过期报告和告警状态
+    clean_old_reports()
+    alert_store = AlertStateStore(ALERT_STATE_DB, ALERT_RENOTIFY_INTERVAL)
+    alert_store.clean_old_states()
+
+    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
+    results = []
+    all_details = [] # 用于存储所有表的明细数据
+    today_str = get_date_str()
+    
+    print("开始执行数据质量监控...")
+    try:
+        print(f"查询过滤条件: ds > {get_date_str(3)}")
+
+        for table in TARGET_TABLES:
+            result, details = check_table(checker, table, today_str)
+            results.append(result)
+            all_details.extend(details)
+            
+    except Exception as e:
+        print(f"监控执行过程出错: {e}")
+    finally:
+        checker.close()
+    
+    send_daily_report(results, all_details, today_str, alert_store)
+
+def clean_old_partials(work_dir, days=30):
+    """清理指定天数之前的分布式明细结果目录"""
+    partial_root = os.path.join(work_dir, "partials")
+    if not os.path.exists(partial_root):
+        return
+    
+    threshold_date = datetime.datetime.now() - datetime.timedelta(days=days)
+    for dirname in os.listdir(partial_root):
+        try:
+            dir_date = datetime.datetime.strptime(dirname, '%Y-%m-%d')
+        except ValueError:
+            continue
+        if dir_date < threshold_date:
+            shutil.rmtree(os.path.join(partial_root, dirname), ignore_errors=True)
+            print(f"已删除过期明细结果: {dirname}")
+
+def get_partial_details_path(monitor_date, table, worker_id):
+    """
+    获取单张表明细结果的保存路径 (相对工作目录，分布式模式下由 worker 写入，协调进程汇总)
+    路径包含 worker 标识: 租约过期的 worker 不会覆盖接管者写入的明细
+    """
+    return os.path.join("partials", monitor_date, f"{table}.{worker_id}.json")
+
+def run_worker(monitor_date, work_dir, worker_id):
+    """
+    分布式模式的 worker: 从任务队列中领取表逐个检查，结果写回队列
+    所有表检查完成 (或等待任务入队超时) 后退出
+    :param monitor_date: 监控日期 (YYYY-MM-DD)，即任务批次 ID
+    :param work_dir: 工作目录 (任务队列和明细结果所在目录)
+    :param worker_id: worker 标识
+    """
+    queue = WorkQueue(os.path.join(work_dir, "work_queue.db"), WORK_LEASE_SECONDS, WORK_MAX_ATTEMPTS)
+    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
+    deadline = time.time() + WORK_TIMEOUT
+    checked = 0
+    
+    print(f"Worker {worker_id} 开始领取任务 (监控日期: {monitor_date})...")
+    try:
+        while True:
+            table = queue.claim(monitor_date, worker_id)
+            if table is None:
+                progress = queue.progress(monitor_date)
+                if progress and queue.is_finished(monitor_date):
+                    break
+                if time.time() > deadline:
+                    print(f"等待任务超时，当前进度: {progress}")
+                    break
+                # 其他 worker 的任务还在运行，继续等待 (其租约过期后可被本 worker 接管)
+                time.sleep(WORK_POLL_INTERVAL)
+                continue
+            
+            try:
+                with LeaseKeeper(queue, monitor_date, table, worker_id) as lease:
+                    result, details = check_table(checker, table, monitor_date)
+                if lease.lost:
+                    continue
+                
+                # 先写明细再提交结果，保证协调进程看到完成状态时明细已就绪；
+                # 明细路径随结果一起提交，协调进程只读取提交成功的 worker 写入的明细
+                details_path = get_partial_details_path(monitor_date, table, worker_id)
+                partial_path = os.path.join(work_dir, details_path)
+                os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+                tmp_path = f"{partial_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(details, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, partial_path)
+                
+                if queue.complete(monitor_date, table, worker_id, {"result": result, "details_path": details_path}):
+                    checked += 1
+                else:
+                    print(f"[{table}] 提交结果失败，任务已被其他 worker 接管")
+            except Exception as e:
+                print(f"[{table}] 检查出错，放回队列: {e}")
+                queue.release(monitor_date, table, worker_id, error=str(e))
+    finally:
+        checker.close()
+    
+    print(f"Worker {worker_id} 退出，共完成 {checked} 张表")
+
+def run_coordinator(monitor_date, work_dir, recheck=False):
+    """
+    分布式模式的协调进程: 将所有表放入任务队列，等待 worker 检查完成后汇总生成日报
+    同一监控日期重复运行时，失败的表会重新检查，已完成的表只在 recheck=True 时重新检查
+    :param monitor_date: 监控日期 (YYYY-MM-DD)，即任务批次 ID
+    :param work_dir: 工作目录 (任务队列和明细结果所在目录)
+    :param recheck: 是否重新检查已完成的表 (如数据晚到)
+    """
+    # 先清理过期报告、告警状态和明细结果
+    clean_old_reports()
+    clean_old_partials(work_dir)
+    alert_store = AlertStateStore(ALERT_STATE_DB, ALERT_RENOTIFY_INTERVAL)
+    alert_store.clean_old_states()
+    
+    queue = WorkQueue(os.path.join(work_dir, "work_queue.db"), WORK_LEASE_SECONDS, WORK_MAX_ATTEMPTS)
+    added = queue.enqueue(monitor_date, TARGET_TABLES, recheck=recheck)
+    print(f"已添加 {added} 个检查任务 (监控日期: {monitor_date})，等待 worker 执行...")
+    
+    deadline = time.time() + WORK_TIMEOUT
+    while not queue.is_finished(monitor_date):
+        if time.time() > deadline:
+            print(f"等待超时，未完成的表将标记为异常")
+            break
+        queue.requeue_expired(monitor_date)
+        print(f"当前进度: {queue.progress(monitor_date)}")
+        time.sleep(WORK_POLL_INTERVAL)
+    
+    # 按配置顺序汇总各表结果
+    task_results = queue.results(monitor_date)
+    results = []
+    all_details = []
+    for table in TARGET_TABLES:
+        status, result = task_results.get(table, (None, None))
+        if status == 'done':
+            results.append(result["result"])
+            partial_path = os.path.join(work_dir, result["details_path"])
+            if os.path.exists(partial_path):
+                with open(partial_path, encoding='utf-8') as f:
+                    all_details.extend(json.load(f))
+        else:
+            error = (result or {}).get("error") or "检查未完成"
+            results.append({
+                "table": table.split('.')[-1],
+                "checks": [{"name": "检查任务", "passed": False, "msg": error}],
+                "is_healthy": False
+            })
+    
+    send_daily_report(results, all_details, monitor_date, alert_store)
+
+def run_backfill(start_ds, end_ds):
+    """
+    回溯检查一段日期区间内每一天的数据质量，汇总为一份报告
+    每张表只执行一次按 ds 分组的聚合查询 (数据量和字段分布)，再在本地逐天计算检查项
+    :param start_ds: 开始日期 (包含)，格式 YYYY-MM-DD
+    :param end_ds: 结束日期 (包含)，格式 YYYY-MM-DD
+    """
+    check_days = []
+    day = start_ds
+    while day <= end_ds:
+        check_days.append(day)
+        day = shift_date_str(day, -1)
+
+    checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
+    results = []
+    summary_rows = [] # 用于存储每张表每天的检查结果
+    
+    print(f"开始执行数据质量回溯检查: {start_ds} ~ {end_ds} (共 {len(check_days)} 天)...")
+    try:
+        # 与日常监控一致，每天取 (当天 - 3天, 当天] 内的最大分区，再加上其前一天用于分布对比，所以多查询 3 天
+        query_start_ds = shift_date_str(start_ds, 3)
+
+        for table in TARGET_TABLES:
+            short_table_name = table.split('.')[-1]
+            
+            print(f"正在检查表: {short_table_name}")
+            table_columns = checker.get_table_columns(table) if get_configured_rules(table) else None
+            rules, missing_rules = get_distribution_rules(table, table_columns)
+            stats = checker.get_value_histograms(table, list(rules), query_start_ds, end_ds)
+            
+            abnormal_days = []
+            for check_day in check_days:
+                # 找到截至当天的最大分区 (等价于日常监控的 max(ds) WHERE ds > 当天-3天)
+                min_ds = shift_date_str(check_day, 3)
+                candidates = [ds for ds in stats if min_ds < ds <= check_day]
+                max_ds = max(candidates) if candidates else None
+                count = stats[max_ds]["count"] if max_ds else 0
+                
+                checks = check_table_status_detail(max_ds, count, base_date=check_day)
+                
+                day_stats = stats.get(max_ds) if max_ds else None
+                prev_day_stats = stats.get(shift_date_str(max_ds, 1)) if max_ds else None
+                checks.extend(build_distribution_checks(rules, missing_rules, count, day_stats, prev_day_stats))
+                
+                is_healthy = all(c['passed'] for c in checks)
+                if not is_healthy:
+                    abnormal_days.append({"ds": check_day, "checks": checks})
+                
+                row = {'作业来源': short_table_name, '检查日期': check_day}
+                for c in checks:
+                    row[c['name']] = c['msg']
+                row['是否正常'] = "是" if is_healthy else "否"
+                summary_rows.append(row)
+            
+            results.append({
+                "table": short_table_name,
+                "abnormal_days": abnormal_days
+            })
+            
+    except Exception as e:
+        print(f"回溯检查执行过程出错: {e}")
+    finally:
+        checker.close()
+    
+    # 生成 Markdown 报告 (只展开异常的日期，完整结果见 CSV)
+    report_lines = [
+        f"### 📊 数据质量回溯报告",
+        f"> 📅 回溯区间: {start_ds} ~ {end_ds} (共 {len(check_days)} 天)",
+        ""
+    ]
+    
+    for item in results:
+        table = item['table']
+        abnormal_days = item['abnormal_days']
+        
+        if not abnormal_days:
+            report_lines.append(f"> **{table}**")
+            report_lines.append(f"> <font color=\"info\">全部 {len(check_days)} 天正常</font>")
+            report_lines.append("") # 空行
+        else:
+            report_lines.append(f"### ❌ {table} (异常 {len(abnormal_days)}/{len(check_days)} 天)")
+            for day_item in abnormal_days:
+                failed_strs = [f"{c['name']}: {c['msg']}" for c in day_item['checks'] if not c['passed']]
+                report_lines.append(f"- 🔻 {day_item['ds']}: <font color=\"warning\">{' | '.join(failed_strs)}</font>")
+            report_lines.append("") # 空行
+
+    markdown_content = "\n".join(report_lines)
+    
+    sender = WeChatSender(WEBHOOK_URL)
+    
     # 1. 发送 Markdown 消息
     print("正在发送企业微信 Markdown 通知...")
     response_md = sender.send_markdown(markdown_content)
     print(f"Markdown 发送结果: {response_md}")
     
-    # 2. 生成并发送 CSV 明细文件
-    # 保存到 reports 目录
+    # 2. 生成并发送 CSV 汇总文件 (每张表每天一行)
     report_dir = os.path.join(os.getcwd(), "reports")
-    csv_filename = os.path.join(report_dir, f"detail_report_{today_str}.csv")
+    csv_filename = os.path.join(report_dir, f"backfill_report_{start_ds}_{end_ds}.csv")
     
-    if save_details_to_csv(all_details, csv_filename):
+    if save_details_to_csv(summary_rows, csv_filename):
         print(f"正在上传并发送文件: {csv_filename}...")
         media_id = sender.upload_file(csv_filename)
         if media_id:
@@ -251,5 +719,41 @@ def run_monitor():
         else:
             print("文件上传失败，跳过文件发送")
 
+def parse_date_arg(value):
+    """校验命令行传入的日期格式 (YYYY-MM-DD)"""
+    try:
+        datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式错误: '{value}'，期望格式 YYYY-MM-DD")
+    return value
+
 if __name__ == "__main__":
-    run_monitor()
+    parser = argparse.ArgumentParser(description="数据质量监控")
+    parser.add_argument(
+        "--backfill", nargs=2, metavar=("START_DS", "END_DS"), type=parse_date_arg,
+        help="回溯检查模式: 检查 START_DS ~ END_DS (包含) 每一天的数据质量，例如 --backfill 2025-12-01 2025-12-07"
+    )
+    parser.add_argument(
+        "--role", choices=["coordinator", "worker"],
+        help="分布式模式: coordinator 将所有表放入任务队列并汇总生成日报，worker 领取并检查表 (可在多个进程/主机上运行)"
+    )
+    parser.add_argument("--run-date", type=parse_date_arg, help="分布式模式的监控日期 (默认为今天)，coordinator 和 worker 需一致")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="分布式模式的工作目录，多台主机运行时需指向共享存储")
+    parser.add_argument("--worker-id", help="worker 标识 (默认为 主机名-进程号)")
+    parser.add_argument("--recheck", action="store_true", help="分布式模式: 同一监控日期重复运行时重新检查已完成的表")
+    args = parser.parse_args()
+    
+    if args.role:
+        run_date = args.run_date or get_date_str()
+        if args.role == "coordinator":
+            run_coordinator(run_date, args.work_dir, recheck=args.recheck)
+        else:
+            run_worker(run_date, args.work_dir, args.worker_id or f"{socket.gethostname()}-{os.getpid()}")
+    elif args.backfill:
+        start_ds, end_ds = args.backfill
+        if start_ds > end_ds:
+            print(f"开始日期 {start_ds} 不能晚于结束日期 {end_ds}")
+            sys.exit(1)
+        run_backfill(start_ds, end_ds)
+    else:
+        run_monitor()
@@ -0,0 +1,277 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+class FileSystem(ABC):
+    """
+    文件系统接口 (分区探测只依赖以下方法，便于替换为本地文件系统或 HDFS)
+    """
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        """判断路径是否存在"""
+
+    @abstractmethod
+    def list_dir(self, path: str) -> List[str]:
+        """列出目录下的文件/子目录名，目录不存在时返回空列表"""
+
+    def wait_for(self, path: str, timeout: float, poll_interval: float = 10) -> bool:
+        """
+        等待路径出现
+        默认实现为按 poll_interval 查询元数据 (只访问 NameNode/本地目录，不经过 HiveServer2)，
+        支持原生变更通知的文件系统可覆盖此方法
+        :param path: 路径
+        :param timeout: 最长等待时间 (秒)
+        :param poll_interval: 查询间隔 (秒)
+        :return: 超时前路径是否出现
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if self.exists(path):
+                    return True
+            except Exception as e:
+                # 文件系统短暂不可用时继续等待
+                print(f"查询路径失败 ({path}): {e}")
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(poll_interval, remaining))
+
+class LocalFileSystem(FileSystem):
+    """本地文件系统 (用于测试或表数据在本地/挂载目录上的情况)"""
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def list_dir(self, path: str) -> List[str]:
+        if not os.path.isdir(path):
+            return []
+        return os.listdir(path)
+
+class WebHDFSFileSystem(FileSystem):
+    def __init__(self, base_url: str, user: str = 'hadoop', timeout: int = 10):
+        """
+        通过 WebHDFS REST API 访问 HDFS
+        :param base_url: WebHDFS 地址，如 http://namenode:9870/webhdfs/v1
+        :param user: 访问 HDFS 的用户名
+        :param timeout: 单次请求超时时间 (秒)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.user = user
+        self.timeout = timeout
+
+    def _request(self, path: str, op: str) -> Optional[dict]:
+        """发送 WebHDFS 请求，路径不存在时返回 None"""
+        response = requests.get(
+            f"{self.base_url}{path}",
+            params={'op': op, 'user.name': self.user},
+            timeout=self.timeout
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def exists(self, path: str) -> bool:
+        return self._request(path, 'GETFILESTATUS') is not None
+
+    def list_dir(self, path: str) -> List[str]:
+        result = self._request(path, 'LISTSTATUS')
+        if not result:
+            return []
+        return [status['pathSuffix'] for status in result['FileStatuses']['FileStatus']]
+
+class PartitionProbe:
+    def __init__(self, fs: FileSystem, location: str, partition_key: str = 'ds', marker: Optional[str] = None):
+        """
+        通过表的存储目录判断分区是否产出 (不查询 Hive)
+        :param fs: 文件系统实例
+        :param location: 表的存储路径 (DESCRIBE FORMATTED 中的 Location，如 hdfs://nameservice/user/hive/warehouse/db.db/table)
+        :param partition_key: 分区字段名
+        :param marker: 分区完成标记文件名 (如 _SUCCESS)，为 None 时分区目录存在即视为产出
+        """
+        self.fs = fs
+        # 去掉 hdfs://nameservice 等前缀，只保留路径部分
+        self.location = urlparse(location).path.rstrip('/') or location
+        self.partition_key = partition_key
+        self.marker = marker
+
+    def partition_path(self, ds: str) -> str:
+        """获取分区目录路径"""
+        return f"{self.location}/{self.partition_key}={ds}"
+
+    def _ready_path(self, ds: str) -> str:
+        """判断分区产出所依据的路径 (标记文件或分区目录)"""
+        path = self.partition_path(ds)
+        return f"{path}/{self.marker}" if self.marker else path
+
+    def is_ready(self, ds: str) -> bool:
+        """分区是否已产出"""
+        return self.fs.exists(self._ready_path(ds))
+
+    def wait_for(self, ds: str, timeout: float, poll_interval: float = 10) -> bool:
+        """
+        等待分区产出
+        :param ds: 分区日期
+        :param timeout: 最长等待时间 (秒)
+        :param poll_interval: 查询间隔 (秒)
+        :return: 超时前分区是否产出
+        """
+        ready_path = self._ready_path(ds)
+        print(f"等待分区产出: {ready_path}")
+        return self.fs.wait_for(ready_path, timeout, poll_interval)
+
+    def list_partitions(self) -> List[str]:
+        """
+        列出存储目录下的所有分区日期 (不判断完成标记)，按日期倒序
+        只保留 YYYY-MM-DD 格式的分区，忽略 __HIVE_DEFAULT_PARTITION__ 及临时目录等非日期分区
+        """
+        prefix = f"{self.partition_key}="
+        dates = []
+        for name in self.fs.list_dir(self.location):
+            if not name.startswith(prefix):
+                continue
+            ds = name[len(prefix):]
+            try:
+                datetime.strptime(ds, "%Y-%m-%d")
+            except ValueError:
+                continue
+            dates.append(ds)
+        return sorted(dates, reverse=True)
+
+    def latest_partition(self, min_ds: Optional[str] = None) -> Optional[str]:
+        """
+        获取已产出的最新分区
+        :param min_ds: 最小日期过滤 (ds > min_ds)
+        :return: 最新分区日期，没有时返回 None
+        """
+        for ds in self.list_partitions():
+            if min_ds and ds <= min_ds:
+                break
+            if not self.marker or self.is_ready(ds):
+                return ds
+        return None
+
+def filesystem_for_location(location: str, webhdfs_url: Optional[str] = None, webhdfs_user: str = 'hadoop') -> Optional[FileSystem]:
+    """
+    根据存储路径的协议选择文件系统
+    :param location: 表的存储路径
+    :param webhdfs_url: WebHDFS 地址，hdfs:// 路径需要配置
+    :param webhdfs_user: 访问 HDFS 的用户名
+    :return: 文件系统实例，不支持的协议返回 None
+    """
+    scheme = urlparse(location).scheme
+    if scheme in ('', 'file'):
+        return LocalFileSystem()
+    if scheme in ('hdfs', 'viewfs') and webhdfs_url:
+        return WebHDFSFileSystem(webhdfs_url, webhdfs_user)
+    return None
+
+class TableLocationCache:
+    def __init__(self, path: str):
+        """
+        表存储路径缓存 (本地 JSON 文件)，表的存储路径很少变化，缓存后每次运行不必再执行 DESCRIBE FORMATTED
+        :param path: 缓存文件路径
+        """
+        self.path = path
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取存储路径缓存失败: {e}")
+            return {}
+
+    def _save(self, locations: dict):
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再替换，避免多个进程同时写入时读到不完整的文件
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(locations, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, checker, table_name: str) -> Optional[str]:
+        """
+        获取表的存储路径，缓存中没有时查询 Hive 并写入缓存
+        :param checker: HiveChecker 实例
+        :param table_name: 表名
+        :return: 存储路径，查询失败返回 None
+        """
+        location = self._load().get(table_name)
+        if location:
+            return location
+
+        location = checker.get_table_location(table_name)
+        if location:
+            locations = self._load()
+            locations[table_name] = location
+            try:
+                self._save(locations)
+            except Exception as e:
+                print(f"保存存储路径缓存失败: {e}")
+        return location
+
+    def forget(self, table_name: str):
+        """删除表的缓存路径 (如路径已失效)，下次重新查询"""
+        locations = self._load()
+        if locations.pop(table_name, None) is not None:
+            try:
+                self._save(locations)
+            except Exception as e:
+                print(f"保存存储路径缓存失败: {e}")
+
+def create_partition_probe(checker, table_name: str, webhdfs_url: Optional[str] = None,
+                           webhdfs_user: str = 'hadoop', marker: Optional[str] = None,
+                           columns: Optional[List[str]] = None,
+                           location_cache: Optional[TableLocationCache] = None) -> Optional[PartitionProbe]:
+    """
+    为按 ds 分区的表创建分区探测器
+    :param checker: HiveChecker 实例
+    :param table_name: 表名
+    :param webhdfs_url: WebHDFS 地址
+    :param webhdfs_user: 访问 HDFS 的用户名
+    :param marker: 分区完成标记文件名 (如 _SUCCESS)
+    :param columns: 调用方已查询的表字段列表，传入时据此跳过无 ds 字段的表；
+                    为 None 时不查询表结构，只根据存储目录下是否有 ds= 子目录判断
+    :param location_cache: 存储路径缓存，为 None 时每次查询 DESCRIBE FORMATTED
+    :return: PartitionProbe，表不按 ds 分区或存储路径不支持时返回 None (调用方回退为 SQL 查询)
+    """
+    if columns is not None and 'ds' not in columns:
+        print(f"[{table_name}] 无 ds 分区字段，不使用分区目录探测")
+        return None
+
+    if location_cache:
+        location = location_cache.get(checker, table_name)
+    else:
+        location = checker.get_table_location(table_name)
+    if not location:
+        return None
+
+    fs = filesystem_for_location(location, webhdfs_url, webhdfs_user)
+    if fs is None:
+        print(f"[{table_name}] 不支持的存储路径 ({location})，不使用分区目录探测")
+        return None
+
+    probe = PartitionProbe(fs, location, marker=marker)
+    # ds 可能只是普通字段: 存储目录下没有 ds= 子目录时不使用探测
+    if not probe.list_partitions():
+        print(f"[{table_name}] 存储路径下没有 ds 分区目录，不使用分区目录探测")
+        if location_cache:
+            # 缓存的路径可能已失效 (如表被重建到其他目录)，下次重新查询
+            location_cache.forget(table_name)
+        return None
+
+    print(f"[{table_name}] 使用分区目录探测: {location}")
+    return probe
@@ -1,6 +1,10 @@
+import os
+import socket
 import sys
 import time
+from alert_state import AlertStateStore
 from hive_checker import HiveChecker
+from partition_probe import TableLocationCache, create_partition_probe
 from wechat_sender import WeChatSender
 
 # 配置信息
@@ -9,6 +13,73 @@ HIVE_PORT = 10000
 HIVE_USER = 'hadoop'
 WEBHOOK_URL = "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=d741ee77-b177-4f92-b478-e5357cadf990"
 
+# 告警状态存储 (与 monitor_task.py 共用)，相同 (表, 检查项, 日期) 只在状态变化或超过重复提醒间隔时发送
+ALERT_STATE_DB = os.path.join(os.getcwd(), "state", "alert_state.db")
+ALERT_RENOTIFY_INTERVAL = 4 * 3600 # 异常持续时每 4 小时重复提醒一次
+ALERT_DIGEST_INTERVAL = 10 * 60 # "检查通过"通知最多每 10 分钟合并发送一次 (没有其他运行中的检查进程时立即发送)，异常告警立即发送
+ALERT_CHECK_NAME = "前置任务"
+
+# 存储层分区探测: 开启后对按 ds 分区的表直接查询分区目录 (ds=<目标日期>) 是否产出，
+# 产出后才执行 count 校验数据量 (为 0 时按重试间隔重新查询)，分区产出前不再每 5 分钟轮询 SQL；无 ds 分区的表仍使用 SQL 查询
+PARTITION_PROBE_ENABLED = False
+WEBHDFS_URL = None # 例如 "http://192.168.10.3:9870/webhdfs/v1"，hdfs:// 存储路径需要配置
+WEBHDFS_USER = 'hadoop'
+PARTITION_SUCCESS_MARKER = None # 分区完成标记文件 (如 "_SUCCESS")，为 None 时分区目录存在即视为产出
+PROBE_POLL_INTERVAL = 10 # 查询分区目录的间隔 (秒)
+TABLE_LOCATION_CACHE = os.path.join(os.getcwd(), "state", "table_locations.json") # 表存储路径缓存 (与 monitor_task.py 共用)，避免每次运行执行 DESCRIBE FORMATTED
+
+def check_by_partition_probe(checker, probe, table_name, target_date, timeout, retry_interval):
+    """
+    通过分区目录等待目标分区产出，产出后校验数据量 (数据量为 0 时按重试间隔重新查询，直到超时)
+    :param checker: HiveChecker 实例
+    :param probe: PartitionProbe 实例
+    :param table_name: 表名
+    :param target_date: 目标日期
+    :param timeout: 最长等待时间 (秒)
+    :param retry_interval: 数据量为 0 时重新查询的间隔 (秒)
+    :return: (passed, status_msg)
+    """
+    deadline = time.time() + timeout
+    if not probe.wait_for(target_date, timeout, PROBE_POLL_INTERVAL):
+        return False, f"等待 {int(timeout // 60)} 分钟分区仍未产出"
+    
+    # 分区目录可能先于数据写入完成创建，数据量为 0 时继续等待
+    while True:
+        count = checker.get_partition_count(table_name, target_date)
+        print(f"分区已产出，数据量: {count}")
+        if count > 0:
+            return True, f"分区已产出，数据量 {count} 条"
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False, "分区已产出但数据量为 0"
+        wait_seconds = min(retry_interval, remaining)
+        print(f"等待 {int(wait_seconds)} 秒后重新查询数据量...")
+        time.sleep(wait_seconds)
+
+def notify_passed(sender, alert_store, table_name, target_date, owner_id):
+    """发送检查通过通知 (同一表同一日期只发送一次)"""
+    msg = (
+        f"✅ **前置任务检查通过**\n"
+        f"> 表名: `{table_name}`\n"
+        f"> 目标日期: {target_date}\n"
+        f"> 检查结果: {table_name} 作为前置已经完成了"
+    )
+    print("检查通过，发送通知...")
+    alert_store.update(table_name, ALERT_CHECK_NAME, target_date, True, msg)
+    alert_store.flush(sender, title="前置任务检查汇总", owner_id=owner_id)
+
+def notify_failed(sender, alert_store, table_name, target_date, status_msg, owner_id):
+    """发送检查未通过报警 (重复提醒间隔内不重复发送)"""
+    error_msg = (
+        f"❌ **前置任务未完成 (异常报警)**\n"
+        f"> 表名: `{table_name}`\n"
+        f"> 目标日期: {target_date}\n"
+        f"> 状态: {status_msg}"
+    )
+    print("\n检查未通过，发送报警通知...")
+    alert_store.update(table_name, ALERT_CHECK_NAME, target_date, False, error_msg)
+    alert_store.flush(sender, title="前置任务检查汇总", force=True, owner_id=owner_id)
+
 def main():
     if len(sys.argv) < 3:
         print("Usage: python pre_job_check.py <table_name> <target_date> [max_retries]")
@@ -33,11 +104,38 @@ def main():
     
     checker = HiveChecker(HIVE_HOST, HIVE_PORT, HIVE_USER)
     sender = WeChatSender(WEBHOOK_URL)
+    alert_store = AlertStateStore(ALERT_STATE_DB, ALERT_RENOTIFY_INTERVAL, ALERT_DIGEST_INTERVAL)
     
     # 策略: 跑 max_retries 次，每次间隔5分钟 (300秒)
     # 第1次立即执行，失败则等待5分钟执行第2次...
     retry_interval = 300  
     
+    # 登记本进程退出前会发送汇总，其他进程的"检查通过"通知可以留给本进程合并发送
+    owner_id = f"{socket.gethostname()}-{os.getpid()}"
+    alert_store.register_sender(owner_id, max_retries * retry_interval + 600)
+    
+    probe = None
+    if PARTITION_PROBE_ENABLED:
+        try:
+            # 不查询表结构，只根据存储目录下是否有 ds= 子目录判断是否使用探测
+            probe = create_partition_probe(
+                checker, table_name, WEBHDFS_URL, WEBHDFS_USER, PARTITION_SUCCESS_MARKER,
+                location_cache=TableLocationCache(TABLE_LOCATION_CACHE)
+            )
+        except Exception as e:
+            print(f"创建分区探测失败，使用 SQL 查询: {e}")
+    
+    if probe:
+        # 总等待时间与 SQL 重试方式一致: (重试次数 - 1) * 重试间隔
+        passed, status_msg = check_by_partition_probe(
+            checker, probe, table_name, target_date, max(max_retries - 1, 0) * retry_interval, retry_interval
+        )
+        if passed:
+            notify_passed(sender, alert_store, table_name, target_date, owner_id)
+            sys.exit(0)
+        notify_failed(sender, alert_store, table_name, target_date, status_msg, owner_id)
+        sys.exit(1)
+    
     for i in range(max_retries):
         attempt = i + 1
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
@@ -54,14 +152,7 @@ def main():
                 print(f"当前数据库最大日期: {current_date_str}")
                 
                 if current_date_str == target_date:
-                    msg = (
-                        f"✅ **前置任务检查通过**\n"
-                        f"> 表名: `{table_name}`\n"
-                        f"> 目标日期: {target_date}\n"
-                        f"> 检查结果: {table_name} 作为前置已经完成了"
-                    )
-                    print("检查通过，发送通知...")
-                    sender.send_markdown(msg)
+                    notify_passed(sender, alert_store, table_name, target_date, owner_id)
                     sys.exit(0)
                 else:
                     print(f"日期不匹配 ({current_date_str} != {target_date})")
@@ -77,14 +168,7 @@ def main():
             time.sleep(retry_interval)
             
     # 循环结束仍未通过
-    error_msg = (
-        f"❌ **前置任务未完成 (异常报警)**\n"
-        f"> 表名: `{table_name}`\n"
-        f"> 目标日期: {target_date}\n"
-        f"> 状态: 已重试 {max_retries} 次仍不满足条件"
-    )
-    print("\n检查未通过，发送报警通知...")
-    sender.send_markdown(error_msg)
+    notify_failed(sender, alert_store, table_name, target_date, f"已重试 {max_retries} 次仍不满足条件", owner_id)
     sys.exit(1)
 
 if __name__ == "__main__":
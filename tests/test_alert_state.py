@@ -0,0 +1,140 @@
+from alert_state import AlertStateStore
+
+DS = "2025-12-10"
+
+class StubSender:
+    """记录发送内容的 WeChatSender 替身，errcode 非 0 时模拟发送失败"""
+
+    def __init__(self, errcode=0):
+        self.errcode = errcode
+        self.messages = []
+
+    def send_markdown(self, content):
+        self.messages.append(content)
+        return {"errcode": self.errcode}
+
+def make_store(tmp_path, renotify_interval=3600, digest_interval=0):
+    return AlertStateStore(str(tmp_path / "alert_state.db"), renotify_interval, digest_interval)
+
+def pending_keys(store):
+    conn = store._connect()
+    try:
+        return conn.execute("SELECT table_name, check_name, ds FROM alert_state WHERE pending = 1").fetchall()
+    finally:
+        conn.close()
+
+def last_digest_at(store):
+    conn = store._connect()
+    try:
+        row = conn.execute("SELECT last_sent_at FROM digest_log WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def test_update_notifies_on_first_seen_and_transitions(tmp_path):
+    store = make_store(tmp_path)
+
+    assert store.update("t", "数据量", DS, True, queue=False)
+    assert not store.update("t", "数据量", DS, True, queue=False)
+    # 正常 -> 异常
+    assert store.update("t", "数据量", DS, False, queue=False)
+    # 异常持续，未超过重复提醒间隔
+    assert not store.update("t", "数据量", DS, False, queue=False)
+    # 异常 -> 正常
+    assert store.update("t", "数据量", DS, True, queue=False)
+    # 不同日期、不同检查项分别记录
+    assert store.update("t", "数据量", "2025-12-11", True, queue=False)
+    assert store.update("t", "数据时效", DS, True, queue=False)
+
+def test_failing_check_renotifies_after_interval(tmp_path):
+    store = make_store(tmp_path, renotify_interval=0)
+
+    assert store.update("t", "数据量", DS, False, queue=False)
+    assert store.update("t", "数据量", DS, False, queue=False)
+    # 正常状态不重复提醒
+    store.update("t", "数据量", DS, True, queue=False)
+    assert not store.update("t", "数据量", DS, True, queue=False)
+
+def test_needs_notify_does_not_record_state(tmp_path):
+    store = make_store(tmp_path)
+
+    assert store.needs_notify("t", "数据量", DS, False)
+    assert store.needs_notify("t", "数据量", DS, False)
+    store.update("t", "数据量", DS, False, queue=False)
+    assert not store.needs_notify("t", "数据量", DS, False)
+    assert store.needs_notify("t", "数据量", DS, True)
+
+def test_flush_sends_pending_alerts_once(tmp_path):
+    store = make_store(tmp_path)
+    sender = StubSender()
+    store.update("t1", "前置任务", DS, True, "> t1 ok")
+    store.update("t2", "前置任务", DS, True, "> t2 ok")
+    # 调用方自行发送的告警不进入队列
+    store.update("t3", "前置任务", DS, True, "> t3 ok", queue=False)
+
+    assert store.flush(sender) == 2
+    assert len(sender.messages) == 1
+    assert "> t1 ok" in sender.messages[0] and "> t2 ok" in sender.messages[0]
+    assert "> t3 ok" not in sender.messages[0]
+    assert store.flush(sender) == 0
+    assert len(sender.messages) == 1
+
+def test_flush_defers_only_while_another_sender_is_active(tmp_path):
+    store = make_store(tmp_path, digest_interval=3600)
+    sender = StubSender()
+    store.update("t1", "前置任务", DS, True, "> t1 ok")
+    assert store.flush(sender) == 1
+
+    # 距上次汇总不足间隔，且还有其他进程会 flush: 推迟发送
+    store.register_sender("other", ttl=600)
+    store.register_sender("me", ttl=600)
+    store.update("t2", "前置任务", DS, True, "> t2 ok")
+    assert store.flush(sender, owner_id="me") == 0
+    assert pending_keys(store) == [("t2", "前置任务", DS)]
+
+    # 最后一个登记的进程退出时立即发送，不会留下无人发送的告警
+    assert store.flush(sender, owner_id="other") == 1
+    assert pending_keys(store) == []
+    assert len(sender.messages) == 2
+
+def test_flush_ignores_expired_senders_and_force(tmp_path):
+    store = make_store(tmp_path, digest_interval=3600)
+    sender = StubSender()
+    store.update("t1", "前置任务", DS, True, "> t1 ok")
+    store.flush(sender)
+
+    # 登记已过期的进程 (如异常退出) 不再推迟发送
+    store.register_sender("crashed", ttl=-1)
+    store.update("t2", "前置任务", DS, True, "> t2 ok")
+    assert store.flush(sender) == 1
+
+    store.register_sender("other", ttl=600)
+    store.update("t3", "前置任务", DS, False, "> t3 failed")
+    assert store.flush(sender, force=True) == 1
+    assert len(sender.messages) == 3
+
+def test_failed_send_requeues_without_marking_digest(tmp_path):
+    store = make_store(tmp_path, digest_interval=3600)
+    store.update("t1", "前置任务", DS, True, "> t1 ok")
+
+    assert store.flush(StubSender(errcode=93000)) == 0
+    assert pending_keys(store) == [("t1", "前置任务", DS)]
+    assert last_digest_at(store) is None
+
+    # 重试成功后才记录汇总时间
+    assert store.flush(StubSender()) == 1
+    assert pending_keys(store) == []
+    assert last_digest_at(store) is not None
+
+def test_build_digests_splits_by_size():
+    alerts = [("t", "前置任务", DS, "x" * 100) for _ in range(5)]
+
+    messages = AlertStateStore.build_digests("汇总", alerts, max_bytes=250)
+    assert [len(keys) for _, keys in messages] == [2, 2, 1]
+    for content, _ in messages:
+        assert content.startswith("### 🔔 汇总")
+        assert len(content.encode('utf-8')) <= 250
+
+    # 单条超长的告警单独成一条消息
+    messages = AlertStateStore.build_digests("汇总", [("t", "c", DS, "y" * 500)], max_bytes=250)
+    assert len(messages) == 1
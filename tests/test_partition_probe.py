@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from partition_probe import (FileSystem, LocalFileSystem, PartitionProbe, TableLocationCache, create_partition_probe,
+                             filesystem_for_location)
+
+class FakeChecker:
+    """只记录 DESCRIBE FORMATTED 调用次数的 HiveChecker 替身"""
+
+    def __init__(self, location):
+        self.location = location
+        self.location_queries = 0
+
+    def get_table_location(self, table_name):
+        self.location_queries += 1
+        return self.location
+
+def make_partitions(root, dates, marker=None):
+    """在 root 下创建 ds=<日期> 分区目录，marker 不为空时在目录中写入完成标记"""
+    for ds in dates:
+        path = os.path.join(root, f"ds={ds}")
+        os.makedirs(path)
+        if marker:
+            open(os.path.join(path, marker), 'w').close()
+
+def test_list_partitions_sorted_desc_and_ignores_other_entries(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-08", "2025-12-10", "2025-12-09"])
+    os.makedirs(tmp_path / "_tmp")
+    (tmp_path / "part-00000").write_text("")
+
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path))
+    assert probe.list_partitions() == ["2025-12-10", "2025-12-09", "2025-12-08"]
+
+def test_non_date_partitions_are_ignored(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-08", "2025-12-09", "__HIVE_DEFAULT_PARTITION__", "2025-12-10.tmp", "20251211"])
+
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path))
+    assert probe.list_partitions() == ["2025-12-09", "2025-12-08"]
+    assert probe.latest_partition(min_ds="2025-12-06") == "2025-12-09"
+
+def test_list_partitions_missing_location(tmp_path):
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path / "missing"))
+    assert probe.list_partitions() == []
+    assert probe.latest_partition() is None
+
+def test_partition_path_strips_scheme():
+    probe = PartitionProbe(LocalFileSystem(), "hdfs://nameservice/user/hive/warehouse/db.db/t/")
+    assert probe.partition_path("2025-12-10") == "/user/hive/warehouse/db.db/t/ds=2025-12-10"
+
+def test_latest_partition_without_marker(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-08", "2025-12-09"])
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path))
+    assert probe.latest_partition() == "2025-12-09"
+
+def test_latest_partition_with_marker_skips_unfinished(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-08", "2025-12-09"], marker="_SUCCESS")
+    make_partitions(str(tmp_path), ["2025-12-10"])
+
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path), marker="_SUCCESS")
+    assert not probe.is_ready("2025-12-10")
+    assert probe.is_ready("2025-12-09")
+    assert probe.latest_partition() == "2025-12-09"
+
+def test_latest_partition_min_ds_cutoff(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-08", "2025-12-09"], marker="_SUCCESS")
+    make_partitions(str(tmp_path), ["2025-12-10"])
+
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path), marker="_SUCCESS")
+    # 只有 min_ds 之后的分区参与判断 (ds > min_ds)
+    assert probe.latest_partition(min_ds="2025-12-08") == "2025-12-09"
+    assert probe.latest_partition(min_ds="2025-12-09") is None
+
+def test_wait_for_ready_and_timeout(tmp_path):
+    make_partitions(str(tmp_path), ["2025-12-09"], marker="_SUCCESS")
+    make_partitions(str(tmp_path), ["2025-12-10"])
+
+    probe = PartitionProbe(LocalFileSystem(), str(tmp_path), marker="_SUCCESS")
+    assert probe.wait_for("2025-12-09", timeout=0)
+    assert not probe.wait_for("2025-12-10", timeout=0.05, poll_interval=0.01)
+
+def test_filesystem_for_location():
+    assert isinstance(filesystem_for_location("/data/t"), LocalFileSystem)
+    assert isinstance(filesystem_for_location("file:///data/t"), LocalFileSystem)
+    assert filesystem_for_location("hdfs://nameservice/t") is None
+    assert filesystem_for_location("s3a://bucket/t") is None
+
+def test_location_cache_queries_once(tmp_path):
+    checker = FakeChecker("/data/t")
+    cache = TableLocationCache(str(tmp_path / "state" / "table_locations.json"))
+
+    assert cache.get(checker, "db.t") == "/data/t"
+    assert TableLocationCache(cache.path).get(checker, "db.t") == "/data/t"
+    assert checker.location_queries == 1
+
+    cache.forget("db.t")
+    assert cache.get(checker, "db.t") == "/data/t"
+    assert checker.location_queries == 2
+
+def test_create_partition_probe(tmp_path):
+    table_dir = tmp_path / "t"
+    make_partitions(str(table_dir), ["2025-12-09"])
+    checker = FakeChecker(str(table_dir))
+    cache = TableLocationCache(str(tmp_path / "table_locations.json"))
+
+    probe = create_partition_probe(checker, "db.t", location_cache=cache)
+    assert probe.latest_partition() == "2025-12-09"
+    assert create_partition_probe(checker, "db.t", columns=["ds", "status"], location_cache=cache)
+    assert checker.location_queries == 1
+
+    # 表字段中没有 ds 时不查询存储路径
+    assert create_partition_probe(checker, "db.t", columns=["day"], location_cache=cache) is None
+    assert checker.location_queries == 1
+
+def test_create_partition_probe_forgets_location_without_partitions(tmp_path):
+    checker = FakeChecker(str(tmp_path / "missing"))
+    cache = TableLocationCache(str(tmp_path / "table_locations.json"))
+
+    assert create_partition_probe(checker, "db.t", location_cache=cache) is None
+    assert create_partition_probe(checker, "db.t", location_cache=cache) is None
+    assert checker.location_queries == 2
+
+def test_incomplete_filesystem_cannot_be_instantiated():
+    class ExistsOnly(FileSystem):
+        def exists(self, path):
+            return True
+
+    with pytest.raises(TypeError):
+        ExistsOnly()
@@ -0,0 +1,91 @@
+import time
+
+from work_queue import WorkQueue
+
+RUN_ID = "2025-12-10"
+
+def make_queue(tmp_path, lease_seconds=600, max_attempts=3):
+    return WorkQueue(str(tmp_path / "work_queue.db"), lease_seconds, max_attempts)
+
+def expire_leases(queue):
+    """将运行中任务的租约改为已过期"""
+    conn = queue._connect()
+    try:
+        conn.execute("UPDATE tasks SET lease_expires_at = ? WHERE status = 'running'", (time.time() - 1,))
+    finally:
+        conn.close()
+
+def test_claims_never_return_same_task(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue(RUN_ID, ["db.a", "db.b"]) == 2
+
+    first = queue.claim(RUN_ID, "w1")
+    second = queue.claim(RUN_ID, "w2")
+    assert {first, second} == {"db.a", "db.b"}
+    assert queue.claim(RUN_ID, "w3") is None
+    assert queue.progress(RUN_ID) == {"running": 2}
+
+def test_expired_lease_is_requeued_then_failed(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue(RUN_ID, ["db.a"])
+
+    assert queue.claim(RUN_ID, "w1") == "db.a"
+    expire_leases(queue)
+    # 第一次过期: 放回队列，被其他 worker 领取
+    assert queue.claim(RUN_ID, "w2") == "db.a"
+
+    expire_leases(queue)
+    queue.requeue_expired(RUN_ID)
+    # 已达到最大领取次数: 标记为失败
+    assert queue.progress(RUN_ID) == {"failed": 1}
+    assert queue.is_finished(RUN_ID)
+    status, result = queue.results(RUN_ID)["db.a"]
+    assert status == "failed"
+    assert "租约过期" in result["error"]
+
+def test_stale_worker_cannot_heartbeat_or_complete(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(RUN_ID, ["db.a"])
+
+    queue.claim(RUN_ID, "w1")
+    expire_leases(queue)
+    assert queue.claim(RUN_ID, "w2") == "db.a"
+
+    assert not queue.heartbeat(RUN_ID, "db.a", "w1")
+    assert not queue.complete(RUN_ID, "db.a", "w1", {"from": "w1"})
+    assert queue.heartbeat(RUN_ID, "db.a", "w2")
+    assert queue.complete(RUN_ID, "db.a", "w2", {"from": "w2"})
+    assert queue.results(RUN_ID)["db.a"] == ("done", {"from": "w2"})
+
+def test_release_fails_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue(RUN_ID, ["db.a"])
+
+    queue.claim(RUN_ID, "w1")
+    queue.release(RUN_ID, "db.a", "w1", error="boom")
+    assert queue.progress(RUN_ID) == {"pending": 1}
+
+    queue.claim(RUN_ID, "w1")
+    queue.release(RUN_ID, "db.a", "w1", error="boom")
+    assert queue.results(RUN_ID)["db.a"] == ("failed", {"error": "boom"})
+
+def test_enqueue_resets_failed_and_recheck_resets_done(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue(RUN_ID, ["db.a", "db.b", "db.c"])
+
+    queue.claim(RUN_ID, "w1")  # db.a
+    queue.release(RUN_ID, "db.a", "w1", error="boom")
+    queue.claim(RUN_ID, "w1")  # db.b
+    queue.complete(RUN_ID, "db.b", "w1", {"ok": True})
+    queue.claim(RUN_ID, "w1")  # db.c 保持运行中
+    assert queue.progress(RUN_ID) == {"failed": 1, "done": 1, "running": 1}
+
+    # 重复入队: 只重置失败的任务 (领取次数清零)，已完成和运行中的任务不变
+    assert queue.enqueue(RUN_ID, ["db.a", "db.b", "db.c"]) == 1
+    assert queue.progress(RUN_ID) == {"pending": 1, "done": 1, "running": 1}
+    assert queue.claim(RUN_ID, "w2") == "db.a"
+
+    # recheck: 已完成的任务也重新放回队列
+    assert queue.enqueue(RUN_ID, ["db.a", "db.b", "db.c"], recheck=True) == 1
+    assert queue.progress(RUN_ID) == {"pending": 1, "running": 2}
+    assert queue.claim(RUN_ID, "w2") == "db.b"
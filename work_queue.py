@@ -0,0 +1,273 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+class WorkQueue:
+    def __init__(self, db_path: str, lease_seconds: int = 600, max_attempts: int = 3):
+        """
+        初始化任务队列 (SQLite 文件，可放在单机或共享存储上供多个 worker 进程/主机使用)
+        :param db_path: SQLite 文件路径
+        :param lease_seconds: 任务租约时长 (秒)，worker 需在租约到期前续约，否则任务会被重新放回队列
+        :param max_attempts: 单个任务最多被领取的次数，超过后标记为失败
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """建立 SQLite 连接 (timeout 用于等待其他进程释放写锁)"""
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+    def _init_db(self):
+        """创建任务表"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " run_id TEXT NOT NULL,"
+                " task_key TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending',"  # pending / running / done / failed
+                " worker_id TEXT,"
+                " lease_expires_at REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (run_id, task_key))"
+            )
+        finally:
+            conn.close()
+
+    def enqueue(self, run_id: str, task_keys: List[str], recheck: bool = False) -> int:
+        """
+        添加任务，已失败的任务重新放回队列 (领取次数清零)
+        :param run_id: 批次 ID (如监控日期)
+        :param task_keys: 任务列表 (如表名)
+        :param recheck: 是否将已完成的任务也重新放回队列 (如数据晚到后重新检查)
+        :return: 新添加或重新放回队列的任务数
+        """
+        now = time.time()
+        reset_status = ('failed', 'done') if recheck else ('failed',)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (run_id, task_key, updated_at) VALUES (?, ?, ?)",
+                [(run_id, key, now) for key in task_keys]
+            )
+            # 运行中的任务不受影响
+            conn.executemany(
+                f"UPDATE tasks SET status = 'pending', attempts = 0, result = NULL, worker_id = NULL, "
+                f"lease_expires_at = NULL, updated_at = ? WHERE run_id = ? AND task_key = ? "
+                f"AND status IN ({', '.join('?' * len(reset_status))})",
+                [(now, run_id, key) + reset_status for key in task_keys]
+            )
+            changed = conn.total_changes - before
+            conn.execute("COMMIT")
+            return changed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _requeue_expired(self, conn: sqlite3.Connection, run_id: str, now: float):
+        """将租约过期的任务重新放回队列 (超过最大领取次数的标记为失败)，需在事务中调用"""
+        expired = conn.execute(
+            "SELECT task_key, worker_id, attempts FROM tasks "
+            "WHERE run_id = ? AND status = 'running' AND lease_expires_at < ?",
+            (run_id, now)
+        ).fetchall()
+        for task_key, worker_id, attempts in expired:
+            if attempts >= self.max_attempts:
+                print(f"[{task_key}] 租约过期 (worker: {worker_id})，已领取 {attempts} 次，标记为失败")
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', worker_id = NULL, lease_expires_at = NULL, "
+                    "result = ?, updated_at = ? WHERE run_id = ? AND task_key = ?",
+                    (json.dumps({"error": f"租约过期 {attempts} 次"}, ensure_ascii=False), now, run_id, task_key)
+                )
+            else:
+                print(f"[{task_key}] 租约过期 (worker: {worker_id})，重新放回队列")
+                conn.execute(
+                    "UPDATE tasks SET status = 'pending', worker_id = NULL, lease_expires_at = NULL, "
+                    "updated_at = ? WHERE run_id = ? AND task_key = ?",
+                    (now, run_id, task_key)
+                )
+
+    def requeue_expired(self, run_id: str):
+        """将租约过期的任务重新放回队列"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_expired(conn, run_id, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, run_id: str, worker_id: str) -> Optional[str]:
+        """
+        领取一个待处理任务
+        :param run_id: 批次 ID
+        :param worker_id: worker 标识
+        :return: 任务 key，没有可领取的任务时返回 None
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 立即获取写锁，保证同一任务只会被一个 worker 领取
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_expired(conn, run_id, now)
+            row = conn.execute(
+                "SELECT task_key FROM tasks WHERE run_id = ? AND status = 'pending' "
+                "ORDER BY attempts, task_key LIMIT 1",
+                (run_id,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', worker_id = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE run_id = ? AND task_key = ?",
+                    (worker_id, now + self.lease_seconds, now, run_id, row[0])
+                )
+            conn.execute("COMMIT")
+            return row[0] if row else None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, run_id: str, task_key: str, worker_id: str) -> bool:
+        """
+        续约任务
+        :return: 是否续约成功 (租约已过期并被其他 worker 领取时返回 False)
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires_at = ?, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, now, run_id, task_key, worker_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, run_id: str, task_key: str, worker_id: str, result: dict) -> bool:
+        """
+        提交任务结果
+        :param result: 任务结果 (可 JSON 序列化)
+        :return: 是否提交成功 (任务已被其他 worker 接管时返回 False，结果丢弃)
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = 'running'",
+                (json.dumps(result, ensure_ascii=False, default=str), now, run_id, task_key, worker_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self, run_id: str, task_key: str, worker_id: str, error: str = ""):
+        """
+        放弃任务 (如处理出错)，立即放回队列供其他 worker 重试，超过最大领取次数的标记为失败
+        :param error: 出错信息，标记为失败时记录到结果中
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "result = CASE WHEN attempts >= ? THEN ? ELSE result END, "
+                "worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = 'running'",
+                (self.max_attempts, self.max_attempts, json.dumps({"error": error}, ensure_ascii=False),
+                 now, run_id, task_key, worker_id)
+            )
+        finally:
+            conn.close()
+
+    def progress(self, run_id: str) -> dict:
+        """
+        查询批次进度
+        :return: {状态: 任务数}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT status, count(1) FROM tasks WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
+
+    def is_finished(self, run_id: str) -> bool:
+        """批次中的任务是否都已完成或失败"""
+        progress = self.progress(run_id)
+        return bool(progress) and not progress.get('pending') and not progress.get('running')
+
+    def results(self, run_id: str) -> dict:
+        """
+        查询批次中已结束任务的结果
+        :return: {任务 key: (状态, 结果)}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT task_key, status, result FROM tasks WHERE run_id = ? AND status IN ('done', 'failed')",
+                (run_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {key: (status, json.loads(result) if result else None) for key, status, result in rows}
+
+class LeaseKeeper:
+    def __init__(self, queue: WorkQueue, run_id: str, task_key: str, worker_id: str):
+        """
+        后台线程定期为任务续约 (用于 with 语句包裹耗时的任务处理)
+        :param queue: WorkQueue 实例
+        :param run_id: 批次 ID
+        :param task_key: 任务 key
+        :param worker_id: worker 标识
+        """
+        self.queue = queue
+        self.run_id = run_id
+        self.task_key = task_key
+        self.worker_id = worker_id
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                if not self.queue.heartbeat(self.run_id, self.task_key, self.worker_id):
+                    print(f"[{self.task_key}] 续约失败，任务已被其他 worker 接管")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # 共享存储短暂不可用时继续尝试，租约到期前恢复即可
+                print(f"[{self.task_key}] 续约出错: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        return False